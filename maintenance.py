@@ -1,19 +1,37 @@
 import argparse
+import atexit
 import csv
+import functools
+import itertools
+import re
 import sqlite3
+import sys
 from datetime import datetime, UTC
 from pathlib import Path
 
 DB_FILE = Path("maintenance.db")
 
+# Shared connection, opened on first use and reused by every handler
+_CONN = None
+
+
 def get_connection() -> sqlite3.Connection:
-    conn = sqlite3.connect(DB_FILE)
-    conn.row_factory = sqlite3.Row
-    return conn
+    global _CONN
+    if _CONN is None:
+        _CONN = sqlite3.connect(DB_FILE)
+        _CONN.row_factory = sqlite3.Row
+        # These are per-connection; synchronous=NORMAL is safe under WAL
+        _CONN.execute("PRAGMA synchronous = NORMAL")
+        _CONN.execute("PRAGMA temp_store = MEMORY")
+        _CONN.execute("PRAGMA mmap_size = 268435456")
+        atexit.register(_CONN.close)
+    return _CONN
 
 
 def init_db() -> None:
     conn = get_connection()
+    # journal_mode is persistent, so this only converts the file once
+    conn.execute("PRAGMA journal_mode = WAL")
     cur = conn.cursor()
     cur.execute(
         """
@@ -30,11 +48,70 @@ def init_db() -> None:
         )
         """
     )
+    # list filters by car and orders by date; search filters by mileage
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_records_car_nocase "
+        "ON maintenance_records(car COLLATE NOCASE)"
+    )
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_records_date ON maintenance_records(date)"
+    )
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_records_type_nocase "
+        "ON maintenance_records(type COLLATE NOCASE)"
+    )
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_records_mileage ON maintenance_records(mileage)"
+    )
+
+    # Full-text index over notes, kept in sync with the table by triggers
+    fts_exists = cur.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'records_fts'"
+    ).fetchone()
+    cur.execute(
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS records_fts USING fts5(
+            notes,
+            content = 'maintenance_records',
+            content_rowid = 'id',
+            tokenize = 'unicode61'
+        )
+        """
+    )
+    cur.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS records_fts_ai AFTER INSERT ON maintenance_records
+        BEGIN
+            INSERT INTO records_fts (rowid, notes) VALUES (new.id, new.notes);
+        END
+        """
+    )
+    cur.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS records_fts_ad AFTER DELETE ON maintenance_records
+        BEGIN
+            INSERT INTO records_fts (records_fts, rowid, notes)
+            VALUES ('delete', old.id, old.notes);
+        END
+        """
+    )
+    cur.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS records_fts_au AFTER UPDATE OF notes ON maintenance_records
+        BEGIN
+            INSERT INTO records_fts (records_fts, rowid, notes)
+            VALUES ('delete', old.id, old.notes);
+            INSERT INTO records_fts (rowid, notes) VALUES (new.id, new.notes);
+        END
+        """
+    )
+    if not fts_exists:
+        # Index rows that were added before the FTS table existed
+        cur.execute("INSERT INTO records_fts (records_fts) VALUES ('rebuild')")
     conn.commit()
-    conn.close()
 
 
-def print_record(r):
+def format_record(r):
     id_str = f"#{r['id']}"
     date_str = r.get("date", "")
     car_str = r.get("car", "")
@@ -53,14 +130,27 @@ def print_record(r):
 
     rec_type = r.get("type", "maintenance")
     
-    print(f"{id_str:<4} | {date_str} | {car_str} | {mileage_str}")
-    print(f"     {rec_type} - {cost_str}")
+    lines = [
+        f"{id_str:<4} | {date_str} | {car_str} | {mileage_str}",
+        f"     {rec_type} - {cost_str}",
+    ]
 
     notes = r.get("notes")
     if notes:
-        print(f"     Notes: {notes}")
+        lines.append(f"     Notes: {notes}")
+
+    return "\n".join(lines) + "\n\n"
 
-    print()
+
+# Write records in chunks instead of several print() calls per record
+def print_records(records, chunk_size=1000):
+    chunks = []
+    for r in records:
+        chunks.append(format_record(r))
+        if len(chunks) >= chunk_size:
+            sys.stdout.write("".join(chunks))
+            chunks.clear()
+    sys.stdout.write("".join(chunks))
 
 
 def parse_date(date_str):
@@ -70,32 +160,50 @@ def parse_date(date_str):
         raise ValueError(f"Invalid date format '{date_str}'. Use YYYY-MM-DD") 
 
 
+# rows are (car, date, mileage, type, cost, notes, created_at, updated_at)
+# tuples; commits once per batch and returns the last inserted ID
+def bulk_add(rows, batch=1000):
+    conn = get_connection()
+    rows = iter(rows)
+    last_id = None
+
+    while True:
+        chunk = list(itertools.islice(rows, batch))
+        if not chunk:
+            break
+        with conn:
+            conn.executemany(
+                """
+                INSERT INTO maintenance_records (
+                    car, date, mileage, type, cost, notes, created_at, updated_at
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                chunk,
+            )
+        last_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+
+    return last_id
+
+
 def handle_add(args):
-    date_str = args.date or datetime.now().strftime("%Y-%m-%d")
-    now_iso = datetime.now(UTC).isoformat(timespec="seconds")
+    now = datetime.now(UTC)
+    now_iso = now.isoformat(timespec="seconds")
+    # Default to the local calendar date of the same instant
+    date_str = args.date or now.astimezone().date().isoformat()
+    cost = args.cost or 0
 
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(
-        """
-        INSERT INTO maintenance_records (
-            car, date, mileage, type, cost, notes, created_at, updated_at
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        """,
+    new_id = bulk_add([
         (
             args.car,
             date_str,
             args.mileage,
             args.type,
-            args.cost or 0,
+            cost,
             args.notes,
             now_iso,
             now_iso,
-        ),
-    )
-    conn.commit()
-    new_id = cur.lastrowid
-    conn.close()
+        )
+    ])
 
     print("Maintenance record added successfully.")
     print(f"Record ID: {new_id}")
@@ -103,7 +211,7 @@ def handle_add(args):
     print(f"Car: {args.car}")
     print(f"Mileage: {args.mileage}")
     print(f"Type: {args.type}")
-    print(f"Cost: {args.cost or 0}")
+    print(f"Cost: {cost}")
     if args.notes:
         print(f"Notes: {args.notes}")
 
@@ -115,7 +223,7 @@ def handle_list(args):
 
     if args.car:
         rows = cur.execute(
-            "SELECT * FROM maintenance_records WHERE LOWER(car) = LOWER(?) ORDER BY date ASC",
+            "SELECT * FROM maintenance_records WHERE car = ? COLLATE NOCASE ORDER BY date ASC",
             (args.car,)
         ).fetchall()
     else:
@@ -123,126 +231,137 @@ def handle_list(args):
             "SELECT * FROM maintenance_records ORDER BY date ASC"
         ).fetchall()
 
-    conn.close()
-
     if not rows:
         print("No maintenance records found.")
         return
 
     print(f"Showing {len(rows)} maintenance records:")
-    for r in rows:
-        record = dict(r)
-        print_record(record)
+    print_records(dict(r) for r in rows)
 
 
 def handle_export(args):
+    fieldnames = ["id", "date", "car", "mileage", "type", "cost", "notes"]
+
+    # Select columns in CSV order so rows can be written straight from the cursor
     conn = get_connection()
-    cur = conn.cursor()
-    rows = cur.execute("SELECT * FROM maintenance_records ORDER BY date ASC").fetchall()
-    conn.close()
+    cur = conn.execute(
+        f"SELECT {', '.join(fieldnames)} FROM maintenance_records ORDER BY date ASC"
+    )
+    cur.arraysize = 1000
 
-    if not rows:
+    first = cur.fetchone()
+    if first is None:
         print("No records to export.")
         return
 
     output_path = args.file or "maintenance_export.csv"
-
-    fieldnames = ["id", "date", "car", "mileage", "type", "cost", "notes"]
+    count = 0
 
     try:
         with open(output_path, "w", encoding="utf-8", newline="") as f:
-            writer = csv.DictWriter(f, fieldnames=fieldnames)
-            writer.writeheader()
-            for row in rows:
-                r = dict(row)
-                writer.writerow({
-                    "id": r["id"],
-                    "date": r["date"],
-                    "car": r["car"],
-                    "mileage": r["mileage"],
-                    "type": r["type"],
-                    "cost": r["cost"],
-                    "notes": r["notes"],
-                })
+            writer = csv.writer(f)
+            writer.writerow(fieldnames)
+            for row in itertools.chain([first], cur):
+                writer.writerow(row)
+                count += 1
     except OSError as e:
         print(f"Failed to write export file: {e}")
         return
     
-    print(f"Exported {len(rows)} record(s) to {output_path}")
+    print(f"Exported {count} record(s) to {output_path}")
 
 
-def handle_search(args):
-    conn = get_connection()
-    cur = conn.cursor()
-    rows = cur.execute("SELECT * FROM maintenance_records").fetchall()
-    conn.close()
+def like_pattern(text):
+    # Escape LIKE wildcards so the search text is matched literally
+    escaped = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def sanitize_fts_query(text):
+    # Quote each word so FTS5 syntax in user input is taken literally,
+    # and prefix-match the last one so partial words still hit
+    tokens = re.findall(r"\w+", text)
+    if not tokens:
+        return None
+    terms = [f'"{t}"' for t in tokens]
+    terms[-1] += "*"
+    return " ".join(terms)
 
-    records = [dict(r) for r in rows]
 
-    after_date = None
-    before_date = None
+def handle_search(args):
+    after_str = None
+    before_str = None
 
+    # Dates are stored as ISO strings, which compare correctly as text
     if getattr(args, "after", None):
         try:
-            after_date = parse_date(args.after)
+            after_str = parse_date(args.after).strftime("%Y-%m-%d")
         except ValueError as e:
             print(e)
             return
-        
+
     if getattr(args, "before", None):
         try:
-            before_date = parse_date(args.before)
+            before_str = parse_date(args.before).strftime("%Y-%m-%d")
         except ValueError as e:
             print(e)
             return
-        
-    results = []
 
-    for r in records:
-        match = True
-
-        if args.car:
-            if args.car.lower() not in r["car"].lower():
-                match = False
-
-        if match and args.type:
-            if args.type.lower() not in r["type"].lower():
-                match = False
-
-        if match and args.min_mileage is not None:
-            if r["mileage"] is None or r["mileage"] < args.min_mileage:
-                match = False
-
-        if match and args.max_mileage is not None:
-            if r["mileage"] is None or r["mileage"] > args.max_mileage:
-                match = False
-
-        if match and (after_date or before_date):
-            try:
-                record_date = parse_date(r["date"])
-            except ValueError:
-                match = False
-            else:
-                if after_date and record_date <= after_date:
-                    match = False
-                if before_date and record_date >= before_date:
-                    match = False
-
-        if match and args.notes_contains:
-            notes = r.get("notes", "") or ""
-            if args.notes_contains.lower() not in notes.lower():
-                match = False
-
-        if match:
-            results.append(r)
+    # Build WHERE dynamically so SQLite does the filtering
+    clauses = []
+    params = []
+
+    if args.car:
+        clauses.append("car LIKE ? ESCAPE '\\'")
+        params.append(like_pattern(args.car))
+    if args.type:
+        clauses.append("type LIKE ? ESCAPE '\\'")
+        params.append(like_pattern(args.type))
+    if args.min_mileage is not None:
+        clauses.append("mileage >= ?")
+        params.append(args.min_mileage)
+    if args.max_mileage is not None:
+        clauses.append("mileage <= ?")
+        params.append(args.max_mileage)
+    if after_str:
+        clauses.append("date > ?")
+        params.append(after_str)
+    if before_str:
+        clauses.append("date < ?")
+        params.append(before_str)
+
+    sql = "SELECT maintenance_records.* FROM maintenance_records"
+
+    if args.notes_contains:
+        fts_query = sanitize_fts_query(args.notes_contains)
+        if fts_query:
+            # Resolve notes matches through the FTS index in a CTE first so
+            # the other predicates don't push the planner into a full scan
+            sql = (
+                "WITH fts_hits AS ("
+                "SELECT rowid FROM records_fts WHERE records_fts MATCH ?"
+                ") " + sql + " JOIN fts_hits ON fts_hits.rowid = maintenance_records.id"
+            )
+            params.insert(0, fts_query)
+        else:
+            # Nothing indexable (e.g. only punctuation), fall back to LIKE
+            clauses.append("notes LIKE ? ESCAPE '\\'")
+            params.append(like_pattern(args.notes_contains))
+
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+    sql += " ORDER BY date ASC"
+
+    conn = get_connection()
+    rows = conn.execute(sql, params).fetchall()
+    results = [dict(r) for r in rows]
 
     if not results:
         print("No records matched your search.")
         return
     
     print(f"Found {len(results)} matching record(s):")
-    for r in results:
-        print_record(r)
+    print_records(results)
 
 
 
@@ -250,14 +369,12 @@ def handle_delete(args):
     rec_id = args.id
 
     conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(
-        "DELETE FROM maintenance_records WHERE id = ?",
-        (rec_id,),
-    )
+    with conn:
+        cur = conn.execute(
+            "DELETE FROM maintenance_records WHERE id = ?",
+            (rec_id,),
+        )
     deleted_rows = cur.rowcount
-    conn.commit()
-    conn.close()
 
     if deleted_rows == 0:
         print(f"No record found with ID {rec_id}.")
@@ -265,59 +382,44 @@ def handle_delete(args):
         print(f"Record ID {rec_id} deleted successfully.")
 
 
+EDIT_COLUMNS = ("car", "mileage", "type", "cost", "date", "notes")
+
+
+# key flags which EDIT_COLUMNS are being set, so each shape is built once
+@functools.lru_cache(maxsize=64)
+def edit_sql(key):
+    updates = [f"{col} = ?" for col, present in zip(EDIT_COLUMNS, key) if present]
+    updates.append("updated_at = ?")
+    return f"UPDATE maintenance_records SET {', '.join(updates)} WHERE id = ?"
+
+
 def handle_edit(args):
     rec_id = args.id
 
     # Fetch current record
     conn = get_connection()
-    cur = conn.cursor()
-    row = cur.execute(
+    row = conn.execute(
         "SELECT * FROM maintenance_records WHERE id = ?",
         (rec_id,),
     ).fetchone()
 
     if row is None:
-        conn.close()
         print(f"No record found with ID {rec_id}")
         return
 
-    # Build UPDATE dynamically
-    updates = []
-    params = []
+    values = [getattr(args, col) for col in EDIT_COLUMNS]
+    key = tuple(v is not None for v in values)
 
-    if args.car is not None:
-        updates.append("car = ?")
-        params.append(args.car)
-    if args.mileage is not None:
-        updates.append("mileage = ?")
-        params.append(args.mileage)
-    if args.type is not None:
-        updates.append("type = ?")
-        params.append(args.type)
-    if args.cost is not None:
-        updates.append("cost = ?")
-        params.append(args.cost)
-    if args.date is not None:
-        updates.append("date = ?")
-        params.append(args.date)
-    if args.notes is not None:
-        updates.append("notes = ?")
-        params.append(args.notes)
-
-    if not updates:
-        conn.close()
+    if not any(key):
         print("No changes provided.")
         return
 
-    updates.append("updated_at = ?")
+    params = [v for v in values if v is not None]
     params.append(datetime.now(UTC).isoformat(timespec="seconds"))
-
     params.append(rec_id)
-    sql = f"UPDATE maintenance_records SET {', '.join(updates)} WHERE id = ?"
 
-    cur.execute(sql, params)
-    conn.commit()
-    conn.close()
+    with conn:
+        conn.execute(edit_sql(key), params)
 
     print(f"Updated record ID {rec_id}")
 